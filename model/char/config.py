@@ -1,6 +1,6 @@
 import os
 from dataclasses import dataclass, field
-from typing import Tuple, Dict, Any
+from typing import Tuple, Dict, Any, Optional
 
 # 获取模块根目录
 MODULE_ROOT = os.path.dirname(os.path.abspath(__file__))
@@ -11,6 +11,8 @@ class Config:
     # 字符集配置
     CHAR_SET: str = '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
     NUM_CLASSES: int = len(CHAR_SET)
+    # 字符到类别索引的映射
+    CHAR_TO_IDX: Dict[str, int] = field(default_factory=lambda: {c: i for i, c in enumerate(Config.CHAR_SET)})
     CAPTCHA_LENGTH: int = 4
     IMAGE_SIZE: Tuple[int, int] = (100, 40)  # 宽, 高
     
@@ -25,6 +27,10 @@ class Config:
     # 数据生成配置
     TRAIN_RATIO: float = 0.8
     TOTAL_SAMPLES: int = 60000
+    # 随机种子（子集抽样）
+    SEED: int = 42
+    # 生成样本保存为 PNG 时的 zlib 压缩级别（0-9，越低越快、文件越大）
+    SAVE_COMPRESS_LEVEL: int = 1
     
     # 数据增强参数
     AUGMENTATION: Dict[str, Any] = field(default_factory=lambda: {
@@ -42,6 +48,10 @@ class Config:
 
     NUM_WORKERS: int = 4
     PIN_MEMORY: bool = True
+    # 每个 DataLoader worker 缓存的已解码图像数
+    DECODE_CACHE_SIZE: int = 60000
+    # 每个 DataLoader worker 预取的批次数
+    PREFETCH_FACTOR: int = 4
 
     WEIGHT_DECAY: float = 1e-4
     LR_DECAY_PATIENCE: int = 5
@@ -50,6 +60,20 @@ class Config:
 
     LABEL_SMOOTHING: float = 0.1
     DROPOUT: float = 0.2
+    # 混合精度训练（仅 CUDA 生效）
+    USE_AMP: bool = True
+    # 训练时 torch.compile 的编译模式（仅 CUDA 生效，依赖 Triton），None 表示不编译；
+    # 'reduce-overhead' 与 'max-autotune' 会把前向/反向捕获为 CUDA Graph 重放（后者首次编译需数分钟自动调优）；
+    # 编译或试运行失败（如缺少 Triton）时自动回退为未编译模型
+    COMPILE_MODE: Optional[str] = 'reduce-overhead'
+    # Predictor 推理时的编译模式，默认不编译（首次预测无需等待编译）；
+    # 设为 'reduce-overhead' 时批次会填充到固定尺寸，避免每种批次大小重新编译/捕获
+    INFERENCE_COMPILE_MODE: Optional[str] = None
+
+    # 进度条刷新间隔（批次），刷新时需要把损失/准确率同步回主机
+    PROGRESS_INTERVAL: int = 10
+    # 混淆矩阵、预测样本等图表的记录间隔（轮次）
+    LOG_INTERVAL: int = 5
 
     # 早停策略
     EARLY_STOPPING: bool = True
@@ -0,0 +1,103 @@
+import torch
+import torch.nn.functional as F
+
+from model.char.config import config
+
+
+class BatchAugment:
+    """批量数据增强
+
+    在训练循环中对已搬运到设备上的归一化批次 [B, 1, H, W] 做随机仿射、
+    随机透视和亮度/对比度抖动。每个样本独立采样参数，几何变换合成为
+    一个单应矩阵后只调用一次 grid_sample，越界区域以各样本自身的背景色填充。
+    """
+
+    # 透视变换概率
+    perspective_p = 0.3
+
+    def __init__(self):
+        aug = config.AUGMENTATION
+        self.degrees = aug['rotation_range']
+        self.zoom = aug['zoom_range']
+        self.distortion_scale = aug['distortion_scale']
+        self.brightness = aug['brightness_range']
+        self.contrast = aug['contrast_range']
+
+    @torch.no_grad()
+    def __call__(self, images: torch.Tensor) -> torch.Tensor:
+        images = self._warp(images)
+        return self._jitter(images)
+
+    def _warp(self, images: torch.Tensor) -> torch.Tensor:
+        """随机仿射 + 随机透视"""
+        b, _, h, w = images.shape
+        device = images.device
+        half = torch.tensor([w / 2, h / 2], device=device)
+
+        # 仿射逆变换：缩放 1/s，旋转 -angle（以图像中心为原点）
+        angle = torch.empty(b, device=device).uniform_(-self.degrees, self.degrees).deg2rad_()
+        scale = torch.empty(b, device=device).uniform_(1 - self.zoom, 1 + self.zoom)
+        cos, sin = torch.cos(angle) / scale, torch.sin(angle) / scale
+        affine_inv = torch.zeros(b, 3, 3, device=device)
+        affine_inv[:, 0, 0], affine_inv[:, 0, 1] = cos, sin
+        affine_inv[:, 1, 0], affine_inv[:, 1, 1] = -sin, cos
+        affine_inv[:, 2, 2] = 1
+
+        # 透视：四个角点各自向内随机偏移，求输出角点到输入角点的单应矩阵
+        corners = torch.tensor([[-1., -1.], [1., -1.], [1., 1.], [-1., 1.]], device=device) * half
+        offset = torch.rand(b, 4, 2, device=device) * self.distortion_scale * half
+        offset *= (torch.rand(b, 1, 1, device=device) < self.perspective_p)
+        dst = corners - corners.sign() * offset
+        src = corners.expand(b, 4, 2)
+        perspective_inv = self._homography(dst, src)
+
+        # 输出像素中心坐标（以图像中心为原点）
+        ys, xs = torch.meshgrid(
+            torch.arange(h, device=device) + 0.5 - h / 2,
+            torch.arange(w, device=device) + 0.5 - w / 2,
+            indexing='ij'
+        )
+        points = torch.stack([xs, ys, torch.ones_like(xs)], dim=-1).view(1, -1, 3)
+        mapped = points @ (affine_inv @ perspective_inv).transpose(1, 2)
+        grid = (mapped[..., :2] / mapped[..., 2:]) / half
+        grid = grid.view(b, h, w, 2)
+
+        # 以 (x - fill) 采样、零填充后再加回 fill，即越界区域填充背景色
+        fill = self._background(images)
+        warped = F.grid_sample(images - fill, grid, mode='bilinear', padding_mode='zeros', align_corners=False)
+        return warped + fill
+
+    @staticmethod
+    def _background(images: torch.Tensor) -> torch.Tensor:
+        """取每个样本四条边缘像素的众数作为背景色 [B, 1, 1, 1]"""
+        b = images.size(0)
+        border = torch.cat([
+            images[:, 0, [0, -1], :].reshape(b, -1),
+            images[:, 0, :, [0, -1]].reshape(b, -1)
+        ], dim=1)
+        return border.mode(dim=1).values.view(b, 1, 1, 1)
+
+    @staticmethod
+    def _homography(src: torch.Tensor, dst: torch.Tensor) -> torch.Tensor:
+        """批量求解把 src 四点映射到 dst 四点的单应矩阵 [B, 3, 3]"""
+        b = src.size(0)
+        x, y = src[..., 0], src[..., 1]
+        u, v = dst[..., 0], dst[..., 1]
+        zeros, ones = torch.zeros_like(x), torch.ones_like(x)
+        rows_u = torch.stack([x, y, ones, zeros, zeros, zeros, -u * x, -u * y], dim=-1)
+        rows_v = torch.stack([zeros, zeros, zeros, x, y, ones, -v * x, -v * y], dim=-1)
+        a = torch.cat([rows_u, rows_v], dim=1)
+        rhs = torch.cat([u, v], dim=1).unsqueeze(-1)
+        h = torch.linalg.solve(a, rhs).squeeze(-1)
+        return torch.cat([h, torch.ones(b, 1, device=h.device)], dim=1).view(b, 3, 3)
+
+    def _jitter(self, images: torch.Tensor) -> torch.Tensor:
+        """亮度/对比度抖动（在 [0, 1] 空间计算）"""
+        b = images.size(0)
+        images = images * 0.5 + 0.5
+        brightness = torch.empty(b, 1, 1, 1, device=images.device).uniform_(1 - self.brightness, 1 + self.brightness)
+        images = (images * brightness).clamp_(0, 1)
+        contrast = torch.empty(b, 1, 1, 1, device=images.device).uniform_(1 - self.contrast, 1 + self.contrast)
+        mean = images.mean(dim=(1, 2, 3), keepdim=True)
+        images = ((images - mean) * contrast + mean).clamp_(0, 1)
+        return images.sub_(0.5).div_(0.5)
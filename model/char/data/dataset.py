@@ -1,78 +1,51 @@
+import io
 import os
-import random
-from typing import Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Iterator, List, Tuple, Union
 
+import numpy as np
 import torch
 from PIL import Image
-from sympy.strategies.core import switch
-from torch.utils.data import Dataset
-from torchvision import transforms
+from torch.utils.data import DataLoader, Dataset
+from tqdm import tqdm
 
 from model.char.config import config
+from model.char.data.image import background_colors, preprocess, resize
 
 
-def preprocess(img: Image.Image) -> Image.Image:
-    """预处理图像，转为灰度图"""
-    if img.mode != 'L':
-        return img.convert('L')
-    return img
+@lru_cache(maxsize=config.DECODE_CACHE_SIZE)
+def load_image(path: str) -> np.ndarray:
+    """
+    读取图像并灰度化、缩放，结果按路径缓存（常驻 worker 跨 epoch 复用，不再重复解码）
+    
+    仅在预解码缓存不可用（数据目录不可写）时使用；正常情况下样本从 build_cache 写入的缓存读取，
+    其背景色已在构建时按块批量投票，不再逐张统计
+    """
+    with Image.open(path) as img:
+        arr = resize(preprocess(img, draft=True))
+    # 缓存项被多次返回，设为只读，防止调用方原地修改污染后续 epoch
+    arr.setflags(write=False)
+    return arr
+
+def read_files(paths: List[str]) -> List[bytes]:
+    """顺序读取一组文件的原始字节"""
+    data = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            data.append(f.read())
+    return data
 
-def resize(img: Image.Image) -> Image.Image:
-    """保持比例调整尺寸"""
-    target_width, target_height = config.IMAGE_SIZE
-    original_width, original_height = img.size
-    
-    # 计算等比缩放宽度
-    new_width = int(original_width * (target_height / original_height))
-    img_resized = img.resize((new_width, target_height), Image.Resampling.BILINEAR)
-    
-    # 创建新图像
-    new_img = Image.new('L', (target_width, target_height), random.randint(220, 255))
-    
-    # 粘贴图像（居中）
-    if new_width <= target_width:
-        paste_pos = ((target_width - new_width) // 2, 0)
-        new_img.paste(img_resized, paste_pos)
-    else:
-        crop_left = (new_width - target_width) // 2
-        crop_right = crop_left + target_width
-        new_img.paste(img_resized.crop((crop_left, 0, crop_right, target_height)), (0, 0))
-    
-    return new_img
+def normalize(images: torch.Tensor) -> torch.Tensor:
+    """uint8 图像张量归一化到 [-1, 1]（等价于 ToTensor + Normalize(0.5, 0.5)）"""
+    return images.float().mul_(1 / 127.5).sub_(1)
 
 
 class CaptchaDataset(Dataset):
     """验证码数据集"""
     
-    # 训练集增强变换
-    train_transform = transforms.Compose([
-        transforms.Lambda(preprocess),
-        transforms.RandomAffine(
-            degrees=config.AUGMENTATION['rotation_range'],
-            scale=(1-config.AUGMENTATION['zoom_range'], 1+config.AUGMENTATION['zoom_range']),
-            fill=random.randint(220, 255)
-        ),
-        transforms.RandomPerspective(
-            distortion_scale=config.AUGMENTATION['distortion_scale'],
-            p=0.3,
-            fill=random.randint(220, 255)
-        ),
-        transforms.ColorJitter(
-            brightness=config.AUGMENTATION['brightness_range'],
-            contrast=config.AUGMENTATION['contrast_range']
-        ),
-        transforms.Lambda(resize),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.5], std=[0.5])
-    ])
-    
-    # 验证集变换
-    valid_transform = transforms.Compose([
-        transforms.Lambda(preprocess),
-        transforms.Lambda(resize),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.5], std=[0.5])
-    ])
+    # 目录文件列表缓存 {image_dir: (目录修改时间, 文件列表)}
+    _file_cache: Dict[str, Tuple[int, List[str]]] = {}
     
     def __init__(self, mode: str = 'train', num_samples: int = None) -> None:
         """
@@ -90,34 +63,313 @@ class CaptchaDataset(Dataset):
             raise FileNotFoundError(f"数据目录不存在：{self.image_dir}，请先生成数据集")
         
         # 获取图像文件列表 (.png, .jpg, .jpeg)
-        self.image_files = [f for f in os.listdir(self.image_dir) 
-                           if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
-        # 限制样本数
-        if num_samples and mode != 'test' and num_samples < len(self.image_files):
-            import random
-            if mode == 'train':
-                self.image_files = random.sample(self.image_files, int(num_samples*config.TRAIN_RATIO))
-            elif mode == 'valid':
-                self.image_files = random.sample(self.image_files, num_samples-int(num_samples*config.TRAIN_RATIO))
+        self.image_files = self._list_images(mode)
+        
+        # 加载预解码缓存；生成器会同时写入缓存，手动收集的数据集（如测试集）或目录有变化时在此重建，
+        # 数据目录不可写时退回逐张解码
+        self.cache = self._load_cache(mode, self.image_files)
+        if self.cache is None and self.image_files:
+            try:
+                self.build_cache(mode)
+            except OSError as e:
+                print(f"预解码缓存构建失败，逐张解码图像: {e}")
+            else:
+                self.cache = self._load_cache(mode, self.image_files)
+        
+        # 限制样本数（固定种子无放回抽样，索引排序后保持文件顺序）
+        self.indices = np.arange(len(self.image_files))
+        if num_samples and mode in ('train', 'valid') and num_samples < len(self.image_files):
+            train_count = int(num_samples*config.TRAIN_RATIO)
+            count = train_count if mode == 'train' else num_samples - train_count
+            rng = np.random.default_rng(config.SEED)
+            self.indices = np.sort(rng.choice(len(self.image_files), count, replace=False))
+            self.image_files = [self.image_files[i] for i in self.indices]
+        self.image_paths = [os.path.join(self.image_dir, f) for f in self.image_files]
+        
+        # 解析标签 - 对测试集特殊处理
+        # 从文件名解析标签（train/valid格式: index_label.ext, test: label.ext）
+        labels = np.empty((len(self.image_files), config.CAPTCHA_LENGTH), dtype=np.int64)
+        for i, filename in enumerate(self.image_files):
+            if mode != 'test':
+                label_str = filename.split('_')[1].split('.')[0]
+            else:
+                label_str = filename.split('.')[0]
+            # 确保标签长度正确
+            if len(label_str) != config.CAPTCHA_LENGTH:
+                raise ValueError(f"标签长度错误：{label_str}，应为 {config.CAPTCHA_LENGTH} 个字符")
+            labels[i] = [config.CHAR_TO_IDX[c] for c in label_str]
+        self.labels = torch.from_numpy(labels)
+    
+    @classmethod
+    def _list_images(cls, mode: str) -> List[str]:
+        """
+        列出数据目录下的图像文件（按文件名排序）
+        
+        目录未变化时复用进程内缓存或磁盘清单（缓存目录下的 manifest.txt，
+        首行为目录修改时间），跳过目录扫描。
+        """
+        image_dir = os.path.join(config.DATA_ROOT, mode)
+        mtime = os.stat(image_dir).st_mtime_ns
+        cached = cls._file_cache.get(image_dir)
+        if cached is not None and cached[0] == mtime:
+            return list(cached[1])
+        
+        image_files = None
+        manifest_path = os.path.join(cls._cache_dir(mode), 'manifest.txt')
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+            if lines and lines[0] == str(mtime):
+                image_files = lines[1:]
+        
+        if image_files is None:
+            with os.scandir(image_dir) as entries:
+                image_files = sorted(e.name for e in entries
+                                     if e.name.lower().endswith(('.png', '.jpg', '.jpeg')))
+            # 清单写入缓存目录而非数据目录，避免写入本身改变目录修改时间
+            try:
+                os.makedirs(cls._cache_dir(mode), exist_ok=True)
+                with open(manifest_path, 'w', encoding='utf-8') as f:
+                    f.write('\n'.join([str(mtime)] + image_files))
+            except OSError:
+                pass  # 只读数据目录下不保存清单
+        
+        cls._file_cache[image_dir] = (mtime, image_files)
+        return list(image_files)
+    
+    @staticmethod
+    def _cache_dir(mode: str) -> str:
+        return os.path.join(config.DATA_ROOT, 'cache', mode)
+    
+    @classmethod
+    def _load_cache(cls, mode: str, image_files: List[str]) -> Union[np.memmap, None]:
+        """
+        以只读内存映射打开预解码缓存
+        
+        缓存不存在、文件列表与目录不一致、图像尺寸与配置不一致或数据文件大小不符时返回 None
+        """
+        cache_dir = cls._cache_dir(mode)
+        files_path = os.path.join(cache_dir, 'files.txt')
+        images_path = os.path.join(cache_dir, 'images.u8')
+        if not image_files or not os.path.exists(files_path) or not os.path.exists(images_path):
+            return None
+        with open(files_path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        # 首行为缓存图像的高、宽
+        width, height = config.IMAGE_SIZE
+        if not lines or lines[0] != f'{height} {width}' or lines[1:] != image_files:
+            return None
+        if os.path.getsize(images_path) != len(image_files) * height * width:
+            return None
+        return np.memmap(images_path, dtype=np.uint8, mode='r', shape=(len(image_files), height, width))
+    
+    @classmethod
+    def build_cache(cls, mode: str) -> str:
+        """
+        预解码数据集，将灰度化并缩放后的图像写入内存映射文件
+        
+        Args:
+            mode: 数据集模式，'train', 'valid', 或 'test'
+        
+        Returns:
+            缓存目录
+        """
+        image_dir = os.path.join(config.DATA_ROOT, mode)
+        if not os.path.exists(image_dir):
+            raise FileNotFoundError(f"数据目录不存在：{image_dir}，请先生成数据集")
+        image_files = cls._list_images(mode)
+        cache = cls.create_cache(mode, len(image_files))
+        
+        # 分块解码，每块的背景色统一投票后再缩放写入；
+        # 后台线程预读下一块的文件字节，磁盘/网络存储的读延迟与当前块的解码重叠
+        chunk_size = 1024
+        chunks = [
+            [os.path.join(image_dir, filename) for filename in image_files[start:start + chunk_size]]
+            for start in range(0, len(image_files), chunk_size)
+        ]
+        with ThreadPoolExecutor(max_workers=1) as io_pool, \
+                tqdm(total=len(image_files), desc=f"缓存{mode}", unit="样本") as progress_bar:
+            pending = io_pool.submit(read_files, chunks[0]) if chunks else None
+            for k in range(len(chunks)):
+                data = pending.result()
+                if k + 1 < len(chunks):
+                    pending = io_pool.submit(read_files, chunks[k + 1])
+                arrs = []
+                for raw in data:
+                    with Image.open(io.BytesIO(raw)) as image:
+                        arrs.append(np.asarray(preprocess(image, draft=True), dtype=np.uint8))
+                start = k * chunk_size
+                for i, (arr, fill) in enumerate(zip(arrs, background_colors(arrs))):
+                    cache[start + i] = resize(arr, fill)
+                progress_bar.update(len(arrs))
+        
+        return cls.commit_cache(mode, cache, image_files)
+    
+    @classmethod
+    def create_cache(cls, mode: str, num_images: int) -> np.memmap:
+        """
+        新建（覆盖）预解码缓存，写入完成后须调用 commit_cache 才会被数据集使用
+        
+        Args:
+            mode: 数据集模式
+            num_images: 图像数量
+        
+        Returns:
+            可写的内存映射数组 [N, H, W]
+        """
+        cache_dir = cls._cache_dir(mode)
+        os.makedirs(cache_dir, exist_ok=True)
+        # 先删除文件列表，写入中断时缓存不会被误用
+        files_path = os.path.join(cache_dir, 'files.txt')
+        if os.path.exists(files_path):
+            os.remove(files_path)
+        
+        width, height = config.IMAGE_SIZE
+        return np.memmap(
+            os.path.join(cache_dir, 'images.u8'), dtype=np.uint8, mode='w+',
+            shape=(num_images, height, width)
+        )
+    
+    @classmethod
+    def commit_cache(cls, mode: str, cache: np.memmap, image_files: List[str]) -> str:
+        """
+        落盘缓存并写入文件列表（首行为图像的高、宽，其后文件顺序须与目录排序后的文件名一致）
+        
+        Returns:
+            缓存目录
+        """
+        cache.flush()
+        cache_dir = cls._cache_dir(mode)
+        height, width = cache.shape[1:]
+        with open(os.path.join(cache_dir, 'files.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join([f'{height} {width}'] + image_files))
+        return cache_dir
+    
+    def __getstate__(self) -> Dict:
+        """序列化时只传递缓存的路径与形状（DataLoader 以 spawn 启动 worker 时不按值复制整个缓存）"""
+        state = self.__dict__.copy()
+        if self.cache is not None:
+            state['cache'] = (self.cache.filename, self.cache.shape)
+        return state
+    
+    def __setstate__(self, state: Dict) -> None:
+        """反序列化时重新以只读方式映射缓存文件"""
+        if state['cache'] is not None:
+            filename, shape = state['cache']
+            state['cache'] = np.memmap(filename, dtype=np.uint8, mode='r', shape=shape)
+        self.__dict__.update(state)
 
     def __len__(self) -> int:
         return len(self.image_files)
     
     def __getitem__(self, idx: int) -> Tuple[torch.Tensor, torch.Tensor]:
-        image_path = os.path.join(self.image_dir, self.image_files[idx])
-        image = Image.open(image_path)
+        """返回 uint8 图像 [H, W] 与标签，归一化在拷贝到设备后按批次完成"""
+        if self.cache is not None:
+            image = np.array(self.cache[self.indices[idx]])
+        else:
+            # 复制一份，返回的张量不与 load_image 的缓存项共享内存
+            image = np.array(load_image(self.image_paths[idx]))
         
-        # 解析标签 - 对测试集特殊处理
-        # 从文件名解析标签（train/valid格式: index_label.ext, test: label.ext）
-        if self.mode != 'test':
-            label_str = self.image_files[idx].split('_')[1].split('.')[0]
+        return torch.from_numpy(image), self.labels[idx]
+    
+    def __getitems__(self, indices: List[int]) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        批量读取样本（DataLoader 自动分批时代替逐个 __getitem__ 调用）
+        
+        Returns:
+            images: [B, H, W] uint8 图像
+            labels: [B, CAPTCHA_LENGTH] 标签
+        """
+        if self.cache is not None:
+            # 内存映射上的一次花式索引读取整个批次
+            images = np.asarray(self.cache[self.indices[indices]])
         else:
-            label_str = self.image_files[idx].split('.')[0]
-        # 确保标签长度正确
-        if len(label_str) != config.CAPTCHA_LENGTH:
-            raise ValueError(f"标签长度错误：{label_str}，应为 {config.CAPTCHA_LENGTH} 个字符")
-        label = [config.CHAR_SET.index(c) for c in label_str]
-        
-        # 应用变换
-        transform = self.train_transform if self.mode == 'train' else self.valid_transform
-        return transform(image), torch.tensor(label)
\ No newline at end of file
+            images = np.stack([load_image(self.image_paths[i]) for i in indices])
+        return torch.from_numpy(images), self.labels[indices]
+    
+    @staticmethod
+    def collate_fn(batch) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        将 uint8 样本组成批次
+        
+        批次保持 uint8（worker 间传输与锁页内存只有 float32 的 1/4），
+        由 CUDAPrefetcher 拷贝到设备后再用 normalize 归一化
+        
+        Args:
+            batch: __getitems__ 返回的 (images, labels)，或 __getitem__ 样本列表
+        
+        Returns:
+            images: [B, 1, H, W] uint8 图像
+            labels: [B, CAPTCHA_LENGTH] 标签
+        """
+        if isinstance(batch, tuple):
+            images, labels = batch
+        else:
+            images, labels = zip(*batch)
+            images, labels = torch.stack(images), torch.stack(labels)
+        return images.unsqueeze(1), labels
+
+
+def build_dataloader(dataset: CaptchaDataset, shuffle: bool = False, drop_last: bool = False) -> DataLoader:
+    """
+    按配置构建数据加载器（常驻 worker、锁页内存、批量读取 uint8 批次）
+    
+    Args:
+        dataset: 数据集
+        shuffle: 是否打乱
+        drop_last: 是否丢弃最后不足一批的样本（保持批次形状固定）
+    """
+    num_workers = config.NUM_WORKERS
+    return DataLoader(
+        dataset,
+        batch_size=config.BATCH_SIZE,
+        shuffle=shuffle,
+        drop_last=drop_last,
+        num_workers=num_workers,
+        pin_memory=config.PIN_MEMORY,
+        collate_fn=CaptchaDataset.collate_fn,
+        persistent_workers=num_workers > 0,
+        prefetch_factor=config.PREFETCH_FACTOR if num_workers > 0 else None,
+    )
+
+
+class CUDAPrefetcher:
+    """
+    设备预取器
+    
+    在独立的 CUDA 流上提前把下一批数据拷贝到设备并归一化图像，使主机到设备的拷贝与当前批次的计算重叠。
+    非 CUDA 设备上退化为逐批拷贝。
+    """
+    
+    def __init__(self, loader: DataLoader, device: Union[str, torch.device]):
+        self.loader = loader
+        self.device = torch.device(device)
+        self.stream = torch.cuda.Stream(self.device) if self.device.type == 'cuda' else None
+    
+    def __len__(self) -> int:
+        return len(self.loader)
+    
+    def __iter__(self) -> Iterator[Tuple[torch.Tensor, ...]]:
+        batches = iter(self.loader)
+        next_batch = self._preload(batches)
+        while next_batch is not None:
+            if self.stream is not None:
+                # 等待拷贝完成，并告知分配器这些张量在当前流上使用
+                current_stream = torch.cuda.current_stream(self.device)
+                current_stream.wait_stream(self.stream)
+                for tensor in next_batch:
+                    tensor.record_stream(current_stream)
+            batch = next_batch
+            next_batch = self._preload(batches)
+            yield batch
+    
+    def _preload(self, batches: Iterator) -> Union[Tuple[torch.Tensor, ...], None]:
+        batch = next(batches, None)
+        if batch is None:
+            return None
+        if self.stream is None:
+            images, labels = (tensor.to(self.device) for tensor in batch)
+            return normalize(images), labels
+        with torch.cuda.stream(self.stream):
+            images, labels = (tensor.to(self.device, non_blocking=True) for tensor in batch)
+            return normalize(images), labels
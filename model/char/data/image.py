@@ -0,0 +1,71 @@
+from typing import List, Optional, Union
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from model.char.config import config
+
+
+def preprocess(img: Image.Image, draft: bool = False) -> Image.Image:
+    """预处理图像，转为灰度图
+
+    Args:
+        img: 图像
+        draft: 是否让 JPEG 解码时直接输出灰度并按比例缩小；会原地修改 img，
+            仅用于调用方自行打开、尚未加载的图像
+    """
+    target_height = config.IMAGE_SIZE[1]
+    if draft:
+        # JPEG 解码时直接输出灰度并按比例缩小（其它格式为空操作）
+        img.draft('L', (max(1, img.width * target_height // img.height), target_height))
+    if img.mode != 'L':
+        img = img.convert('L')
+    # 原图远大于目标尺寸时先按整数倍缩小
+    factor = img.height // target_height
+    if factor >= 2:
+        img = img.reduce(factor)
+    return img
+
+def border_pixels(arr: np.ndarray) -> np.ndarray:
+    """灰度图四条边缘的像素"""
+    return np.concatenate([arr[0], arr[-1], arr[:, 0], arr[:, -1]])
+
+def background_color(arr: np.ndarray) -> int:
+    """取灰度图四条边缘像素的众数作为背景色"""
+    return int(np.bincount(border_pixels(arr), minlength=256).argmax())
+
+def background_colors(arrs: List[np.ndarray]) -> np.ndarray:
+    """批量计算多张灰度图的背景色：所有图像的边缘像素在一次 bincount 中投票"""
+    borders = [border_pixels(arr) for arr in arrs]
+    owners = np.repeat(np.arange(len(borders)), [len(b) for b in borders])
+    votes = np.bincount(owners * 256 + np.concatenate(borders), minlength=len(borders) * 256)
+    return votes.reshape(len(borders), 256).argmax(axis=1)
+
+def resize(img: Union[Image.Image, np.ndarray], fill: Optional[int] = None) -> np.ndarray:
+    """保持比例调整尺寸，返回 uint8 数组
+
+    Args:
+        img: 灰度图像
+        fill: 左右填充的背景色，None 表示从图像边缘统计
+    """
+    target_width, target_height = config.IMAGE_SIZE
+    arr = np.asarray(img, dtype=np.uint8)
+    original_height, original_width = arr.shape
+    
+    # 计算等比缩放宽度
+    new_width = int(original_width * (target_height / original_height))
+    
+    if new_width <= target_width:
+        # 直接缩放进预先填充背景色的画布中间（省去一次整图的填充拷贝）
+        pad_left = (target_width - new_width) // 2
+        canvas = np.full((target_height, target_width),
+                         background_color(arr) if fill is None else fill, dtype=np.uint8)
+        cv2.resize(arr, (new_width, target_height), dst=canvas[:, pad_left:pad_left + new_width],
+                   interpolation=cv2.INTER_LINEAR)
+        return canvas
+    
+    # 居中裁剪
+    resized = cv2.resize(arr, (new_width, target_height), interpolation=cv2.INTER_LINEAR)
+    crop_left = (new_width - target_width) // 2
+    return resized[:, crop_left:crop_left + target_width]
@@ -1,18 +1,16 @@
 import os
 import json
 from datetime import datetime
-from typing import Dict, List, Optional, Union, Tuple
+from typing import Dict, List, Optional, Union
 
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import seaborn as sns
 import torch
-from torch.utils.data import DataLoader
 from tqdm import tqdm
 
 from model.char.config import config
-from model.char.data.dataset import CaptchaDataset
+from model.char.data.dataset import CaptchaDataset, CUDAPrefetcher, build_dataloader, normalize
 from model.char.models import BaseModel
 from model.char.utils.metrics import (
     calculate_accuracy, calculate_position_accuracy,
@@ -48,13 +46,7 @@ class Evaluator:
         
         # 加载测试数据集
         self.test_dataset = CaptchaDataset('test')
-        self.test_loader = DataLoader(
-            self.test_dataset,
-            batch_size=config.BATCH_SIZE,
-            shuffle=False,
-            num_workers=config.NUM_WORKERS,
-            pin_memory=config.PIN_MEMORY
-        )
+        self.test_loader = build_dataloader(self.test_dataset)
         
         # 评估结果存储
         self.results = {}
@@ -80,34 +72,27 @@ class Evaluator:
         model.to(self.device)
         model.eval()
         
-        total_acc = 0
-        all_outputs = []
-        all_labels = []
-        all_images = []
+        # 输出保留在设备上，评估结束后一次性拷贝回主机
+        all_logits = torch.empty(
+            (len(self.test_dataset), config.CAPTCHA_LENGTH, config.NUM_CLASSES), device=self.device
+        )
+        offset = 0
+        # 预先抽取用于可视化的样本索引，评估结束后再从数据集读取这些图像
+        sample_indices = np.random.choice(len(self.test_dataset), min(20, len(self.test_dataset)), replace=False)
         
-        with torch.no_grad():
-            for images, labels in tqdm(self.test_loader, desc=f"评估模型: {model_name}"):
-                images = images.to(self.device)
-                labels = labels.to(self.device)
-                
-                # 保存一部分图像用于可视化
-                if len(all_images) < 100:  # 只保存100张图像
-                    all_images.append(images)
-                
+        with torch.inference_mode():
+            # 数据加载器的 worker 常驻，评估多个模型时只创建一次；下一批数据在独立流上提前拷贝到设备
+            for images, labels in tqdm(CUDAPrefetcher(self.test_loader, self.device), desc=f"评估模型: {model_name}"):
                 # 前向传播
                 outputs = model(images)
                 
-                # 保存输出和标签用于计算指标
-                all_outputs.extend([output.cpu() for output in outputs])
-                all_labels.append(labels.cpu())
-        
-        # 转换为张量
-        all_outputs = [torch.cat(outputs, dim=0) for outputs in zip(*[all_outputs])]
-        all_labels = torch.cat(all_labels, dim=0)
+                # 保存输出用于计算指标
+                all_logits[offset:offset + labels.size(0)] = torch.stack(outputs, dim=1)
+                offset += labels.size(0)
         
-        # 如果保存了图像，将它们拼接起来
-        if all_images:
-            all_images = torch.cat(all_images, dim=0)[:100]  # 只使用前100张
+        # 转换为按位置划分的输出列表（测试集按顺序完整遍历，标签直接取数据集解析好的张量）
+        all_outputs = list(all_logits.cpu().unbind(1))
+        all_labels = self.test_dataset.labels
         
         # 计算准确率
         accuracy = calculate_accuracy(all_outputs, all_labels)
@@ -160,23 +145,20 @@ class Evaluator:
                 self.logger.log_scalar(f'models/{model_name}/{name}', value, 0)
         
         # 记录混淆矩阵
-        for i, cm in enumerate(cms):
-            fig = plot_confusion_matrix(cm, classes=list(config.CHAR_SET), normalize=True)
-            self.logger.log_figure(f'models/{model_name}/confusion_matrix_pos{i+1}', fig, 0)
+        self.logger.submit(self._log_confusion_matrices, model_name, cms)
         
         # 记录样本预测
-        if len(all_images) > 0:
+        if len(sample_indices) > 0:
             predictions = torch.stack([output.argmax(1) for output in all_outputs], dim=1)
-            indices = np.random.choice(len(all_images), min(20, len(all_images)), replace=False)
-            
-            sample_images = all_images[indices]
-            sample_predictions = predictions[indices]
-            sample_labels = all_labels[indices]
+            sample_images, sample_labels = CaptchaDataset.collate_fn(
+                self.test_dataset.__getitems__(sample_indices.tolist())
+            )
+            sample_images = normalize(sample_images)
+            sample_predictions = predictions[sample_indices]
             
-            fig = plot_sample_predictions(
-                sample_images, sample_predictions, sample_labels, config.CHAR_SET
+            self.logger.submit(
+                self._log_sample_predictions, model_name, sample_images, sample_predictions, sample_labels
             )
-            self.logger.log_figure(f'models/{model_name}/sample_predictions', fig, 0)
         
         # 保存到评估结果
         self.results[model_name] = result
@@ -186,6 +168,18 @@ class Evaluator:
         
         return result
     
+    def _log_confusion_matrices(self, model_name: str, cms: List[np.ndarray]):
+        """绘制并记录每个位置的混淆矩阵（在绘图线程中执行）"""
+        for i, cm in enumerate(cms):
+            fig = plot_confusion_matrix(cm, classes=list(config.CHAR_SET), normalize=True)
+            self.logger.log_figure(f'models/{model_name}/confusion_matrix_pos{i+1}', fig, 0)
+    
+    def _log_sample_predictions(self, model_name: str, images: torch.Tensor,
+                                predictions: torch.Tensor, labels: torch.Tensor):
+        """绘制并记录样本预测结果（在绘图线程中执行）"""
+        fig = plot_sample_predictions(images, predictions, labels, config.CHAR_SET)
+        self.logger.log_figure(f'models/{model_name}/sample_predictions', fig, 0)
+    
     def _save_result(self, model_name: str, result: Dict):
         """保存评估结果到JSON文件"""
         # 创建模型结果目录
@@ -259,36 +253,50 @@ class Evaluator:
         # 保存为CSV
         df.to_csv(os.path.join(self.output_dir, 'model_comparison.csv'), index=False)
         
-        # 绘制比较图表
-        self._plot_model_comparison(df)
+        # 绘制比较图表（与其他图表共用后台绘图线程），并等待全部图表写出
+        self.logger.submit(self._plot_model_comparison, df)
+        self.logger.flush()
     
     def _plot_model_comparison(self, df: pd.DataFrame):
         """绘制模型比较图表"""
         metrics = ['accuracy', 'precision_avg', 'recall_avg', 'f1_avg', 'gmean_avg', 'auc_avg']
         
+        models = df['model'].tolist()
+        
         # 条形图比较
-        plt.figure(figsize=(15, 10))
-        for i, metric in enumerate(metrics):
-            plt.subplot(2, 3, i+1)
-            sns.barplot(x='model', y=metric, data=df)
-            plt.title(metric)
-            plt.xticks(rotation=45)
-            plt.ylim(0, 1)
+        fig, axes = plt.subplots(2, 3, figsize=(15, 10))
+        for ax, metric in zip(axes.flat, metrics):
+            ax.bar(models, df[metric].to_numpy())
+            ax.set_title(metric)
+            ax.tick_params(axis='x', labelrotation=45)
+            ax.set_ylim(0, 1)
         
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.output_dir, 'model_comparison_bar.png'))
+        fig.tight_layout()
+        fig.savefig(os.path.join(self.output_dir, 'model_comparison_bar.png'))
+        plt.close(fig)
         
         # 雷达图比较
         self._plot_radar_chart(df, metrics)
         
-        # 热力图比较
-        plt.figure(figsize=(12, 8))
-        # 将数据透视为模型x指标的热力图
-        pivot_df = df.set_index('model')[metrics]
-        sns.heatmap(pivot_df, annot=True, fmt='.4f', cmap='YlGnBu')
-        plt.title('模型性能比较热力图')
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.output_dir, 'model_comparison_heatmap.png'))
+        # 热力图比较：模型 x 指标
+        values = df[metrics].to_numpy(dtype=float)
+        fig, ax = plt.subplots(figsize=(12, 8))
+        image = ax.imshow(values, cmap='YlGnBu', aspect='auto')
+        fig.colorbar(image, ax=ax)
+        ax.set_xticks(np.arange(len(metrics)))
+        ax.set_xticklabels(metrics)
+        ax.set_yticks(np.arange(len(models)))
+        ax.set_yticklabels(models)
+        # 标注数值，深色格子用白字
+        threshold = (np.nanmin(values) + np.nanmax(values)) / 2
+        for i in range(values.shape[0]):
+            for j in range(values.shape[1]):
+                ax.text(j, i, f'{values[i, j]:.4f}', ha='center', va='center',
+                        color='white' if values[i, j] > threshold else 'black')
+        ax.set_title('模型性能比较热力图')
+        fig.tight_layout()
+        fig.savefig(os.path.join(self.output_dir, 'model_comparison_heatmap.png'))
+        plt.close(fig)
     
     def _plot_radar_chart(self, df: pd.DataFrame, metrics: List[str]):
         """绘制雷达图比较模型性能"""
@@ -327,6 +335,7 @@ class Evaluator:
         plt.title('模型性能雷达图比较')
         plt.tight_layout()
         plt.savefig(os.path.join(self.output_dir, 'model_comparison_radar.png'))
+        plt.close(fig)
     
     def evaluate_models(self, models: Dict[str, Union[BaseModel, str]]):
         """
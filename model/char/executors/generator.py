@@ -1,12 +1,15 @@
 import math
+import multiprocessing as mp
 import os
 import random
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 from tqdm import tqdm
 
 from model.char.config import config
+from model.char.data.image import preprocess, resize
 
 
 class Generator:
@@ -17,6 +20,12 @@ class Generator:
         self.fonts = self._load_fonts()
         self.char_set = config.CHAR_SET
         self.length = config.CAPTCHA_LENGTH
+        # 字体对象缓存 {(字体路径, 字号): 字体}，避免每张图重新解析 TTF 文件
+        self._font_cache: Dict[Tuple[str, int], ImageFont.FreeTypeFont] = {}
+        # 字符宽度缓存 {(字体路径, 字号, 字符): 宽度}
+        self._width_cache: Dict[Tuple[str, int, str], int] = {}
+        # 字形覆盖率蒙版缓存 {(字体路径, 字号, 字符): 蒙版}，每个字形只光栅化一次
+        self._glyph_cache: Dict[Tuple[str, int, str], Image.Image] = {}
     
     def _load_fonts(self) -> List[str]:
         """加载字体文件"""
@@ -34,6 +43,35 @@ class Generator:
         
         return font_files
     
+    def _get_font(self, path: str, size: int) -> ImageFont.FreeTypeFont:
+        """获取指定字体和字号的字体对象（带缓存）"""
+        key = (path, size)
+        font = self._font_cache.get(key)
+        if font is None:
+            font = ImageFont.truetype(path, size)
+            self._font_cache[key] = font
+        return font
+    
+    def _get_char_width(self, path: str, size: int, char: str) -> int:
+        """获取字符在指定字体和字号下的绘制宽度（带缓存）"""
+        key = (path, size, char)
+        width = self._width_cache.get(key)
+        if width is None:
+            width = math.ceil(self._get_font(path, size).getlength(char))
+            self._width_cache[key] = width
+        return width
+    
+    def _get_glyph(self, path: str, size: int, char: str) -> Image.Image:
+        """获取字符在原点处绘制的覆盖率蒙版（'L' 模式，宽度与字符宽度一致，带缓存）"""
+        key = (path, size, char)
+        glyph = self._glyph_cache.get(key)
+        if glyph is None:
+            font = self._get_font(path, size)
+            glyph = Image.new('L', (self._get_char_width(path, size, char), max(1, font.getbbox(char)[3])), 0)
+            ImageDraw.Draw(glyph).text((0, 0), char, font=font, fill=255)
+            self._glyph_cache[key] = glyph
+        return glyph
+    
     def generate(self, total_samples: Optional[int] = None):
         """生成数据集
         
@@ -65,29 +103,65 @@ class Generator:
         print(f"📊 验证集: {valid_count} 样本")
         
         # 生成数据集
-        self._generate(train_dir, train_count, "训练集")
-        self._generate(valid_dir, valid_count, "验证集")
+        self._generate('train', train_count, "训练集")
+        self._generate('valid', valid_count, "验证集")
         
         print("✅ 数据集生成完成!")
     
-    def _generate(self, output_dir: str, count: int, desc: str):
-        """生成指定数量的样本
+    def _generate(self, mode: str, count: int, desc: str):
+        """生成指定数量的样本，同时写入预解码缓存
         
         Args:
-            output_dir: 输出目录
+            mode: 数据集模式，'train' 或 'valid'
             count: 样本数量
             desc: 进度条描述
         """
-        for i in tqdm(range(count), desc=f"生成{desc}", unit="样本"):
-            # 生成随机文本
-            text = ''.join(random.choices(self.char_set, k=self.length))
-            
-            # 生成验证码图像
-            image = self._generate_image(text)
+        # 仅主进程需要数据集模块（写入缓存），放在这里导入，使工作进程不必加载 torch
+        from model.char.data.dataset import CaptchaDataset
+        
+        output_dir = os.path.join(config.DATA_ROOT, mode)
+        
+        # 主进程预先生成文本，从而确定文件名及其在缓存中的位置（按文件名排序）；
+        # 一次抽取全部字符，再把每行 length 个单字符视图合并为一个字符串
+        rng = np.random.default_rng(random.getrandbits(64))
+        chars = np.array(list(self.char_set))[rng.integers(0, len(self.char_set), (count, self.length))]
+        texts = chars.view(f'<U{self.length}').ravel().tolist()
+        image_files = [f"{i:05d}_{text}.png" for i, text in enumerate(texts)]
+        order = sorted(range(count), key=image_files.__getitem__)
+        positions = [0] * count
+        for position, i in enumerate(order):
+            positions[i] = position
+        cache = CaptchaDataset.create_cache(mode, count)
+        
+        # 多进程并行生成；每个样本携带独立种子，进程间随机序列互不重复
+        base_seed = random.getrandbits(32)
+        tasks = [
+            (i, texts[i], os.path.join(output_dir, image_files[i]), base_seed + i)
+            for i in range(count)
+        ]
+        # spawn 启动的工作进程会重新导入 config，运行时修改的保存压缩级别与目标尺寸须显式传入
+        initargs = (self, config.SAVE_COMPRESS_LEVEL, config.IMAGE_SIZE)
+        with mp.get_context('spawn').Pool(os.cpu_count(), initializer=_init_worker, initargs=initargs) as pool:
+            for i, arr in tqdm(pool.imap_unordered(_generate_task, tasks, chunksize=64),
+                               total=count, desc=f"生成{desc}", unit="样本"):
+                cache[positions[i]] = arr
+        
+        CaptchaDataset.commit_cache(mode, cache, [image_files[i] for i in order])
+    
+    def _generate_sample(self, text: str, image_path: str) -> np.ndarray:
+        """生成并保存单个样本
+        
+        Args:
+            text: 验证码文本
+            image_path: 保存路径
             
-            # 保存图像
-            image_path = os.path.join(output_dir, f"{i:05d}_{text}.png")
-            image.save(image_path)
+        Returns:
+            np.ndarray: 灰度化并缩放后的图像（与数据集预解码缓存一致）
+        """
+        image = self._generate_image(text)
+        # PNG 的 zlib 压缩级别由配置决定（默认 1）：噪点图本就难以压缩，默认级别 6 的编码却占了生成耗时的相当一部分
+        image.save(image_path, compress_level=config.SAVE_COMPRESS_LEVEL)
+        return resize(preprocess(image))
     
     def _generate_image(self, text: str) -> Image.Image:
         """生成验证码图像
@@ -98,30 +172,31 @@ class Generator:
         Returns:
             PIL.Image: 生成的验证码图像
         """
+        # 每张图的随机参数一次性批量抽取（种子取自 random，保持按样本种子可复现）
+        rng = np.random.default_rng(random.getrandbits(64))
+        n = len(text)
+        
         # 设置图像参数
-        height = random.randint(30, 50)
-        bg_color = tuple(random.randint(220, 255) for _ in range(3))
+        height = int(rng.integers(30, 51))
+        bg_color = tuple(rng.integers(220, 256, 3).tolist())
         text_box_height = height
-        font_size = int(text_box_height * random.uniform(0.65, 0.85))
-        font = ImageFont.truetype(random.choice(self.fonts), font_size)
+        font_size = int(text_box_height * rng.uniform(0.65, 0.85))
+        font_path = self.fonts[rng.integers(len(self.fonts))]
+        font_colors = rng.integers(0, 201, (n, 3)).tolist()
+        y_offsets = rng.integers(0, int(text_box_height*0.1) + 2, n).tolist()
+        angles = rng.uniform(-15, 15, n).tolist()
         
         # 生成字符图像
         char_imgs = []
-        for char in text:
-            # 字符颜色
-            font_color = tuple(random.randint(0, 200) for _ in range(3))
-            
+        for char, font_color, y_offset, angle in zip(text, font_colors, y_offsets, angles):
             # 字符图像
-            char_width = math.ceil(font.getlength(char))
-            char_img = Image.new('RGBA', (char_width, text_box_height), (0, 0, 0, 0))
-            char_draw = ImageDraw.Draw(char_img)
+            glyph = self._get_glyph(font_path, font_size, char)
+            char_img = Image.new('RGBA', (glyph.width, text_box_height), (0, 0, 0, 0))
             
-            # 绘制字符（随机位置）
-            y_offset = random.randint(0, int(text_box_height*0.1) + 1)
-            char_draw.text((0, y_offset), char, font=font, fill=font_color)
+            # 以缓存的字形蒙版填充字体颜色（随机位置，超出底部的部分被裁掉），与直接绘制文字结果一致
+            char_img.paste(tuple(font_color) + (255,), (0, y_offset), glyph)
             
             # 应用随机旋转
-            angle = random.uniform(-15, 15)
             char_img = char_img.rotate(angle, expand=True, resample=Image.Resampling.BILINEAR)
             
             char_imgs.append(char_img)
@@ -140,19 +215,43 @@ class Generator:
             x += char_img.width
         
         # 添加噪点
-        pixels = image.load()
-        for _ in range(0,int(width * height * 0.01)):
-            x = random.randint(0, width - 1)
-            y = random.randint(0, height - 1)
-            pixels[x, y] = tuple(random.randint(0, 255) for _ in range(3))
-        
-        # 添加干扰线
-        draw = ImageDraw.Draw(image)
-        for _ in range(random.randint(0, 3)):
-            line_color = tuple(random.randint(0, 200) for _ in range(3))
-            points = []
-            for _ in range(random.randint(2, 3)):
-                points.append((random.randint(0, width), random.randint(0, height)))
-            draw.line(points, fill=line_color, width=1)
-        
-        return image 
\ No newline at end of file
+        arr = np.array(image)
+        noise_count = int(width * height * 0.01)
+        ys = rng.integers(0, height, noise_count)
+        xs = rng.integers(0, width, noise_count)
+        arr[ys, xs] = rng.integers(0, 256, (noise_count, 3), dtype=np.uint8)
+        
+        # 添加干扰线（2~3 个点的折线）：所有线段按最长线段的像素跨度等距取点，一次写入数组
+        line_count = int(rng.integers(0, 4))
+        line_colors = rng.integers(0, 201, (line_count, 3))
+        points = rng.integers(0, (width + 1, height + 1), (line_count, 3, 2))
+        point_counts = rng.integers(2, 4, line_count)
+        # 第 i 条折线由前 point_counts[i] 个点构成，即 point_counts[i] - 1 条线段
+        segment_mask = np.arange(2) < (point_counts[:, None] - 1)
+        starts, ends = points[:, :-1][segment_mask], points[:, 1:][segment_mask]
+        if len(starts):
+            colors = np.repeat(line_colors, 2, axis=0)[segment_mask.ravel()].astype(np.uint8)
+            steps = int(np.abs(ends - starts).max()) + 1
+            t = np.linspace(0, 1, steps)[:, None, None]
+            coords = np.rint(starts + (ends - starts) * t).astype(np.intp)
+            xs, ys = coords[..., 0], coords[..., 1]
+            inside = (xs < width) & (ys < height)
+            arr[ys[inside], xs[inside]] = np.broadcast_to(colors, (steps,) + colors.shape)[inside]
+        
+        return Image.fromarray(arr)
+
+# 工作进程内的生成器实例（由主进程序列化传入，字体等配置与主进程一致）
+_worker_generator: Optional[Generator] = None
+
+def _init_worker(generator: Generator, compress_level: int, image_size: Tuple[int, int]):
+    """工作进程初始化：保存生成器实例，并同步主进程的 PNG 压缩级别与图像尺寸（保证与主进程缓存形状一致）"""
+    global _worker_generator
+    _worker_generator = generator
+    config.SAVE_COMPRESS_LEVEL = compress_level
+    config.IMAGE_SIZE = image_size
+
+def _generate_task(task: Tuple[int, str, str, int]) -> Tuple[int, np.ndarray]:
+    """工作进程任务：按样本种子重置随机数后生成一个样本"""
+    index, text, image_path, seed = task
+    random.seed(seed)
+    return index, _worker_generator._generate_sample(text, image_path)
@@ -1,12 +1,17 @@
 import io
-from typing import List, Union, Tuple
+from typing import List, Optional, Union, Tuple
 
+import numpy as np
 import torch
 from PIL import Image
 
 from model.char.config import config
-from model.char.data.dataset import CaptchaDataset
-from model.char.utils.model_util import load_model
+from model.char.data.dataset import normalize
+from model.char.data.image import preprocess, resize
+from model.char.utils.model_util import compile_model, load_model
+
+# 类别索引 -> 字符
+_CHARS = tuple(config.CHAR_SET)
 
 
 class Predictor:
@@ -18,9 +23,11 @@ class Predictor:
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.model.to(self.device)
         self.model.eval()
-
-        # 图像变换
-        self.transform = CaptchaDataset.valid_transform
+        # 编译后的模型仅用于推理（使用独立于训练的编译模式），输入按 _padded_size 填充为固定的几种批次大小
+        example_input = torch.zeros((1, 1, config.IMAGE_SIZE[1], config.IMAGE_SIZE[0]), device=self.device)
+        self.compiled_model = compile_model(
+            self.model, self.device, example_input, mode=config.INFERENCE_COMPILE_MODE
+        )
 
         # 调试信息
         print(f"📷 验证码识别器已初始化")
@@ -38,54 +45,65 @@ class Predictor:
         Returns:
             识别结果和置信度
         """
-        # 加载图像
-        if isinstance(image, str):
-            # 图像路径
-            img = Image.open(image)
-        elif isinstance(image, bytes):
-            # 字节流
-            img = Image.open(io.BytesIO(image))
-        elif isinstance(image, Image.Image):
-            # PIL图像
-            img = image
-        else:
-            raise TypeError("不支持的图像类型")
-
-        # 预处理图像
-        img_tensor = self.transform(img).unsqueeze(0).to(self.device)
-
-        # 推理
-        with torch.no_grad():
-            outputs = self.model(img_tensor)
-
-            # 获取预测结果和置信度
-            confidences = []
-            result = ""
-
-            for output in outputs:
-                # 应用softmax获取概率
-                probs = torch.nn.functional.softmax(output, dim=1)
+        return self.predict_batch([image])[0]
 
-                # 获取最大概率及其索引
-                confidence, pred = probs.max(1)
-
-                # 保存结果
-                result += config.CHAR_SET[pred.item()]
-                confidences.append(confidence.item())
-
-        return result, confidences
-
-    def predict_batch(self, images: List[Union[str, bytes, Image.Image]]) -> List[Tuple[str, List[float]]]:
-        """批量预测验证码
+    def predict_batch(self, images: List[Union[str, bytes, Image.Image]],
+                      batch_size: Optional[int] = None) -> List[Tuple[str, List[float]]]:
+        """批量预测验证码（按批次一次前向推理）
 
         Args:
             images: 图像路径、字节流或PIL图像列表
+            batch_size: 每次推理的最大图像数，默认使用配置中的批次大小
 
         Returns:
             识别结果和置信度列表
         """
+        if batch_size is None:
+            batch_size = config.BATCH_SIZE
+
         results = []
-        for image in images:
-            result, confidences = self.predict(image)
-            results.append((result, confidences))
-        return results
\ No newline at end of file
+        for start in range(0, len(images), batch_size):
+            chunk = images[start:start + batch_size]
+            # 预处理为 uint8 数组并组成批次，拷贝到设备后再整体归一化
+            arrays = np.stack([self._preprocess(image) for image in chunk])
+            if self.compiled_model is not self.model:
+                # 编译模型按固定形状编译，批次填充到 2 的幂（不超过 batch_size），限制编译/捕获的次数
+                padding = self._padded_size(len(chunk), batch_size) - len(chunk)
+                arrays = np.pad(arrays, ((0, padding), (0, 0), (0, 0)))
+            batch = normalize(torch.from_numpy(arrays).unsqueeze(1).to(self.device))
+
+            # 推理
+            with torch.inference_mode():
+                outputs = self.compiled_model(batch)
+                # 应用softmax获取各位置概率，取最大概率及其索引 [B, L]
+                probs = torch.softmax(torch.stack(outputs, dim=1)[:len(chunk)], dim=-1)
+                confidences, predictions = probs.max(dim=-1)
+
+            # 一次性拷贝回主机后解码
+            for pred, confidence in zip(predictions.tolist(), confidences.tolist()):
+                results.append((''.join([_CHARS[i] for i in pred]), confidence))
+        return results
+
+    @staticmethod
+    def _padded_size(size: int, batch_size: int) -> int:
+        """不小于 size 的最小 2 的幂，且不超过 batch_size"""
+        return min(1 << (size - 1).bit_length(), batch_size)
+
+    @staticmethod
+    def _preprocess(image: Union[str, bytes, Image.Image]) -> np.ndarray:
+        """加载图像并灰度化、缩放为 uint8 数组
+
+        自行打开的 JPEG 在 preprocess 中直接以灰度、缩小后的尺寸解码；调用方传入的 PIL 图像不做修改
+        """
+        if isinstance(image, str):
+            # 图像路径
+            with Image.open(image) as img:
+                return resize(preprocess(img, draft=True))
+        elif isinstance(image, bytes):
+            # 字节流
+            with Image.open(io.BytesIO(image)) as img:
+                return resize(preprocess(img, draft=True))
+        elif isinstance(image, Image.Image):
+            # PIL图像
+            return resize(preprocess(image))
+        raise TypeError("不支持的图像类型")
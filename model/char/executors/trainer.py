@@ -1,20 +1,19 @@
 import os
 from datetime import datetime
-from typing import Union, List, Dict, Optional, Tuple
 
 import torch
 from torch import nn
-from torch.utils.data import DataLoader
 from tqdm import tqdm
 
 from model.char.config import config
-from model.char.data.dataset import CaptchaDataset
+from model.char.data.augment import BatchAugment
+from model.char.data.dataset import CaptchaDataset, CUDAPrefetcher, build_dataloader, normalize
 from model.char.models import BaseModel
-from model.char.utils.model_util import save_final_model, save_checkpoint
+from model.char.utils.model_util import compile_model, save_final_model, save_checkpoint
 from model.char.utils.metrics import (
     calculate_accuracy, calculate_position_accuracy,
     calculate_precision_recall_f1, calculate_gmean, 
-    calculate_auc, calculate_confusion_matrices
+    calculate_auc
 )
 from model.char.utils.visualization import TensorboardLogger
 
@@ -34,6 +33,7 @@ class Trainer:
     valid_dataset = None
     train_loader = None
     valid_loader = None
+    valid_labels = None
     current_epoch = 0
     training_time = 0
     start_time = 0
@@ -43,10 +43,24 @@ class Trainer:
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         model.to(self.device)
 
+        # CUDA 上卷积使用 NHWC（channels_last）布局以利用 Tensor Core；输入尺寸固定，由 cuDNN 自动选择最快算法
+        self.memory_format = torch.channels_last if self.device.type == 'cuda' else torch.contiguous_format
+        model.to(memory_format=self.memory_format)
+        if self.device.type == 'cuda':
+            torch.backends.cudnn.benchmark = True
+            # Ampere 及以上架构的 float32 矩阵乘法/卷积使用 TF32 Tensor Core
+            torch.backends.cuda.matmul.allow_tf32 = True
+            torch.backends.cudnn.allow_tf32 = True
+
+        # 参数列表只收集一次，供优化器和每步的梯度裁剪复用
+        self.params = list(model.parameters())
+
+        # CUDA 上使用融合实现，所有参数的更新合并为少量 kernel
         self.optimizer = torch.optim.AdamW(
-            model.parameters(),
+            self.params,
             lr=config.LR,
-            weight_decay=config.WEIGHT_DECAY
+            weight_decay=config.WEIGHT_DECAY,
+            fused=self.device.type == 'cuda'
         )
 
         self.scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(
@@ -59,7 +73,19 @@ class Trainer:
 
         self.criterion = nn.CrossEntropyLoss(label_smoothing=config.LABEL_SMOOTHING)
 
+        # 混合精度：前向与损失在 float16 下计算，梯度缩放防止下溢
+        self.use_amp = config.USE_AMP and self.device.type == 'cuda'
+        self.scaler = torch.amp.GradScaler('cuda', enabled=self.use_amp)
+
+        # 训练集数据增强（在设备上按批次执行）
+        self.augment = BatchAugment()
+
         self.model = model
+        # 编译后的模型与 self.model 共享参数，仅用于前向计算；保存检查点仍使用 self.model
+        example_input = torch.zeros(
+            (config.BATCH_SIZE, 1, config.IMAGE_SIZE[1], config.IMAGE_SIZE[0]), device=self.device
+        ).contiguous(memory_format=self.memory_format)
+        self.compiled_model = compile_model(model, self.device, example_input, mode=config.COMPILE_MODE)
 
         self.experiment_dir = os.path.join(
             config.EXPERIMENT_ROOT,
@@ -74,6 +100,18 @@ class Trainer:
         tensorboard_dir = os.path.join(self.experiment_dir, 'tensorboard')
         self.logger = TensorboardLogger(tensorboard_dir)
 
+    def compute_loss(self, logits: torch.Tensor, labels: torch.Tensor) -> torch.Tensor:
+        """
+        计算多任务损失：所有位置的输出拼接后只调用一次交叉熵
+        
+        乘以位置数后与逐位置损失求和的结果一致（各位置样本数相同）
+        
+        Args:
+            logits: 堆叠后的各位置输出 [B, L, C]
+            labels: 标签 [B, L]
+        """
+        return self.criterion(logits.flatten(0, 1), labels.flatten()) * logits.size(1)
+
     def load_data(self, num_samples: int = None):
         print(f"开始加载数据集..."
               f"(数据集路径: {config.DATA_ROOT})"
@@ -81,24 +119,15 @@ class Trainer:
         # 加载数据集
         self.train_dataset = CaptchaDataset('train', num_samples)
         self.valid_dataset = CaptchaDataset('valid', num_samples)
+        # 验证集标签常驻设备，每个 epoch 直接在设备上计算准确率
+        self.valid_labels = self.valid_dataset.labels.to(self.device)
         print(f"数据集加载完成，训练集样本数: {len(self.train_dataset)}, 验证集样本数: {len(self.valid_dataset)}")
 
-        # 数据加载器
-        self.train_loader = DataLoader(
-            self.train_dataset,
-            batch_size=config.BATCH_SIZE,
-            shuffle=True,
-            num_workers=config.NUM_WORKERS,
-            pin_memory=config.PIN_MEMORY,
-        )
-
-        self.valid_loader = DataLoader(
-            self.valid_dataset,
-            batch_size=config.BATCH_SIZE,
-            shuffle=False,
-            num_workers=config.NUM_WORKERS,
-            pin_memory=config.PIN_MEMORY,
-        )
+        # 数据加载器；使用编译模型时丢弃最后不足一批的样本，保持批次形状固定以免重新编译
+        # （训练集不足一批时保留，否则一个批次都没有）
+        drop_last = self.compiled_model is not self.model and len(self.train_dataset) >= config.BATCH_SIZE
+        self.train_loader = build_dataloader(self.train_dataset, shuffle=True, drop_last=drop_last)
+        self.valid_loader = build_dataloader(self.valid_dataset)
 
     def log_start_info(self):
         """打印训练信息"""
@@ -213,59 +242,62 @@ class Trainer:
 
     def train_epoch(self):
         self.model.train()
-        total_loss = 0
-        all_outputs = []
-        all_labels = []
+        # 损失在设备上累加，epoch 结束时才同步回主机
+        total_loss = torch.zeros((), device=self.device)
+        # 正确数在设备上累加（整体 / 各位置），epoch 结束后统一计算指标（避免逐批次拷贝回主机）
+        correct = torch.zeros((), dtype=torch.long, device=self.device)
+        position_correct = torch.zeros(config.CAPTCHA_LENGTH, dtype=torch.long, device=self.device)
+        total = 0
+        # 学习率只在 epoch 结束时由调度器更新，进度条显示的字符串每个 epoch 只格式化一次
+        lr_str = f'{self.optimizer.param_groups[0]["lr"]:.2e}'
         
         progress_bar = tqdm(
-            self.train_loader,
+            CUDAPrefetcher(self.train_loader, self.device),
             desc=f'Train Epoch {self.current_epoch}/{config.EPOCHS}',
             leave=False
         )
         
         for batch_idx, (images, labels) in enumerate(progress_bar):
-            images = images.to(self.device)
-            labels = labels.to(self.device)
+            images = self.augment(images).contiguous(memory_format=self.memory_format)
 
-            # 前向传播
-            outputs = self.model(images)
+            with torch.autocast(self.device.type, dtype=torch.float16, enabled=self.use_amp):
+                # 前向传播
+                outputs = self.compiled_model(images)
+                logits = torch.stack(outputs, dim=1)
 
-            # 计算多任务损失
-            loss = sum(self.criterion(output, labels[:, i]) for i, output in enumerate(outputs))
+                # 计算多任务损失
+                loss = self.compute_loss(logits, labels)
 
-            # 反向传播
-            self.optimizer.zero_grad()
-            loss.backward()
-            torch.nn.utils.clip_grad_norm_(self.model.parameters(), max_norm=2.0)
-            self.optimizer.step()
+            # 反向传播（裁剪前先还原梯度尺度）
+            self.optimizer.zero_grad(set_to_none=True)
+            self.scaler.scale(loss).backward()
+            self.scaler.unscale_(self.optimizer)
+            # CUDA 上 foreach 实现把所有梯度的范数计算与缩放合并为少量 kernel
+            torch.nn.utils.clip_grad_norm_(self.params, max_norm=2.0, foreach=self.device.type == 'cuda')
+            self.scaler.step(self.optimizer)
+            self.scaler.update()
 
             # 计算指标
-            total_loss += loss.item()
-            
-            # 收集输出和标签用于计算批次级指标
-            for i, output in enumerate(outputs):
-                if len(all_outputs) <= i:
-                    all_outputs.append([])
-                all_outputs[i].append(output.detach().cpu())
-            all_labels.append(labels.detach().cpu())
+            total_loss += loss.detach()
             
-            # 计算当前批次的准确率并更新进度条
-            batch_acc = calculate_accuracy(outputs, labels)
+            # 累加正确数用于计算全局指标
+            matches = logits.detach().argmax(-1) == labels
+            correct += matches.all(dim=1).sum()
+            position_correct += matches.sum(dim=0)
+            total += labels.size(0)
             
-            # 实时更新进度信息
-            progress_bar.set_postfix({
-                'loss': f'{loss.item():.4f}',
-                'acc': f'{batch_acc * 100:.2f}%',
-                'lr': f'{self.optimizer.param_groups[0]["lr"]:.2e}'
-            })
-        
-        # 计算全局指标
-        all_outputs = [torch.cat(outputs, dim=0) for outputs in all_outputs]
-        all_labels = torch.cat(all_labels, dim=0)
+            # 按间隔计算当前批次的准确率并更新进度条（每次更新都会同步设备）
+            if batch_idx % config.PROGRESS_INTERVAL == 0:
+                batch_acc = calculate_accuracy(logits, labels)
+                progress_bar.set_postfix({
+                    'loss': f'{loss.item():.4f}',
+                    'acc': f'{batch_acc * 100:.2f}%',
+                    'lr': lr_str
+                })
         
         # 计算基础指标
-        accuracy = calculate_accuracy(all_outputs, all_labels)
-        position_accuracy = calculate_position_accuracy(all_outputs, all_labels)
+        accuracy = correct.item() / max(total, 1)
+        position_accuracy = (position_correct.double() / max(total, 1)).tolist()
         
         # 训练阶段只记录基础指标
         metrics = {
@@ -273,98 +305,90 @@ class Trainer:
             'position_acc': position_accuracy
         }
         
-        avg_loss = total_loss / len(self.train_loader)
+        avg_loss = total_loss.item() / max(len(self.train_loader), 1)
         return avg_loss, metrics
 
     def validate(self):
         self.model.eval()  # 设置为评估模式
-        total_loss = 0
-        all_outputs = []
-        all_labels = []
-        all_images = []  # 储存一部分验证图像用于可视化
+        total_loss = torch.zeros((), device=self.device)
+        # 输出保留在设备上，验证结束后一次性拷贝回主机
+        all_logits = torch.empty(
+            (len(self.valid_dataset), config.CAPTCHA_LENGTH, config.NUM_CLASSES), device=self.device
+        )
+        offset = 0
         
         progress_bar = tqdm(
-            self.valid_loader,
+            CUDAPrefetcher(self.valid_loader, self.device),
             desc=f"Valid Epoch {self.current_epoch}/{config.EPOCHS}",
             leave=False
         )
         
-        with torch.no_grad():
+        with torch.inference_mode():
             for batch_idx, (images, labels) in enumerate(progress_bar):
-                images = images.to(self.device)
-                labels = labels.to(self.device)
-
-                # 保存部分图像用于可视化
-                if len(all_images) < 100:  # 只保存100张图像
-                    all_images.append(images)
+                images = images.contiguous(memory_format=self.memory_format)
 
-                # 前向传播
-                outputs = self.model(images)
+                with torch.autocast(self.device.type, dtype=torch.float16, enabled=self.use_amp):
+                    # 前向传播
+                    outputs = self.compiled_model(images)
+                    logits = torch.stack(outputs, dim=1)
 
-                # 计算损失
-                loss = sum(self.criterion(output, labels[:, i]) for i, output in enumerate(outputs))
+                    # 计算损失
+                    loss = self.compute_loss(logits, labels)
 
                 # 更新总和
-                total_loss += loss.item()
-                
-                # 收集输出和标签用于计算批次级指标
-                for i, output in enumerate(outputs):
-                    if len(all_outputs) <= i:
-                        all_outputs.append([])
-                    all_outputs[i].append(output.cpu())
-                all_labels.append(labels.cpu())
+                total_loss += loss
                 
-                # 计算当前批次的准确率
-                batch_acc = calculate_accuracy(outputs, labels)
+                # 收集输出用于计算全局指标
+                all_logits[offset:offset + labels.size(0)] = logits
+                offset += labels.size(0)
                 
-                # 更新进度条
-                progress_bar.set_postfix({
-                    'loss': f'{loss.item():.4f}',
-                    'acc': f'{batch_acc * 100:.2f}%'
-                })
-        
-        # 计算全局指标
-        all_outputs = [torch.cat(outputs, dim=0) for outputs in all_outputs]
-        all_labels = torch.cat(all_labels, dim=0)
-        
-        # 如果有保存图像，拼接它们
-        if all_images:
-            all_images = torch.cat(all_images, dim=0)[:100]  # 只使用前100张
+                # 按间隔计算当前批次的准确率并更新进度条
+                if batch_idx % config.PROGRESS_INTERVAL == 0:
+                    batch_acc = calculate_accuracy(logits, labels)
+                    progress_bar.set_postfix({
+                        'loss': f'{loss.item():.4f}',
+                        'acc': f'{batch_acc * 100:.2f}%'
+                    })
         
         # 计算验证指标
         metrics = {}
         
-        # 基础指标
-        accuracy = calculate_accuracy(all_outputs, all_labels)
-        position_accuracy = calculate_position_accuracy(all_outputs, all_labels)
-        metrics['accuracy'] = accuracy
-        metrics['position_acc'] = position_accuracy
-        
-        # 高级指标
-        precisions, recalls, f1s = calculate_precision_recall_f1(
-            all_outputs, all_labels, config.NUM_CLASSES, average='macro'
-        )
-        gmeans = calculate_gmean(all_outputs, all_labels)
-        aucs = calculate_auc(all_outputs, all_labels, config.NUM_CLASSES)
-        
-        metrics['precision'] = precisions
-        metrics['recall'] = recalls
-        metrics['f1'] = f1s
-        metrics['gmean'] = gmeans
-        metrics['auc'] = aucs
+        # 基础指标在设备上计算（验证集按顺序完整遍历，标签为 load_data 中拷贝到设备的数据集标签）
+        metrics['accuracy'] = calculate_accuracy(all_logits, self.valid_labels)
+        metrics['position_acc'] = calculate_position_accuracy(all_logits, self.valid_labels)
         
-        # 验证阶段记录更全面的指标到TensorBoard
-        if self.current_epoch % 5 == 0:
-            # 每5个epoch记录混淆矩阵和预测样本
+        # 验证阶段按间隔（及最后一个epoch）计算高级指标并记录更全面的指标到TensorBoard
+        if self.current_epoch % config.LOG_INTERVAL == 0 or self.current_epoch == config.EPOCHS:
+            # 输出只在需要时拷贝回主机
+            all_outputs = list(all_logits.cpu().unbind(1))
+            all_labels = self.valid_dataset.labels
+            
+            # 高级指标（基于 sklearn，开销较大，其余 epoch 不计算）
+            precisions, recalls, f1s = calculate_precision_recall_f1(
+                all_outputs, all_labels, config.NUM_CLASSES, average='macro'
+            )
+            gmeans = calculate_gmean(all_outputs, all_labels)
+            aucs = calculate_auc(all_outputs, all_labels, config.NUM_CLASSES)
+            
+            metrics['precision'] = precisions
+            metrics['recall'] = recalls
+            metrics['f1'] = f1s
+            metrics['gmean'] = gmeans
+            metrics['auc'] = aucs
+            
+            # 按间隔（及最后一个epoch）记录混淆矩阵和预测样本
             self.logger.log_confusion_matrices(
                 all_outputs, all_labels, config.NUM_CLASSES, config.CHAR_SET, self.current_epoch
             )
             
-            # 如果有图像样本，记录预测结果
-            if len(all_images) > 0:
+            # 从验证集前100张图像中抽样记录预测结果（只在记录时读取，不在验证循环中保留图像）
+            num_images = min(100, len(self.valid_dataset))
+            if num_images > 0:
+                images, _ = CaptchaDataset.collate_fn(self.valid_dataset.__getitems__(list(range(num_images))))
+                images = normalize(images)
                 self.logger.log_sample_predictions(
-                    all_images, all_outputs, all_labels, config.CHAR_SET, self.current_epoch
+                    images, all_outputs, all_labels, config.CHAR_SET, self.current_epoch
                 )
         
-        avg_loss = total_loss / len(self.valid_loader)
+        avg_loss = total_loss.item() / max(len(self.valid_loader), 1)
         return avg_loss, metrics
@@ -1,9 +1,11 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import List, Tuple
 
 import torch
 from torch import nn as nn
 
+from model.char.config import config
+
 
 class BaseModel(nn.Module, ABC):
     """验证码识别模型基类"""
@@ -26,3 +28,35 @@ class BaseModel(nn.Module, ABC):
             输出张量列表，每个元素对应一个位置的分类结果
         """
         pass
+
+
+class MultiHead(nn.Module):
+    """多任务输出头
+
+    各位置的线性分类器合并为一个 Linear(in_features, 位置数 * 类别数)，
+    一次矩阵乘法得到所有位置的分类结果。
+    """
+
+    def __init__(self, in_features: int, num_heads: int = None, num_classes: int = None):
+        """
+        Args:
+            in_features: 输入特征维度
+            num_heads: 位置数，默认为验证码长度
+            num_classes: 类别数，默认为字符集大小
+        """
+        super().__init__()
+        self.num_heads = num_heads or config.CAPTCHA_LENGTH
+        self.num_classes = num_classes or config.NUM_CLASSES
+        self.fc = nn.Linear(in_features, self.num_heads * self.num_classes)
+
+    def forward(self, x: torch.Tensor) -> Tuple[torch.Tensor, ...]:
+        logits = self.fc(x).view(x.size(0), self.num_heads, self.num_classes)
+        return logits.unbind(1)
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        # 兼容旧模型：逐位置的 heads.{i}.weight / heads.{i}.bias 按顺序拼接为合并后的权重
+        for name in ('weight', 'bias'):
+            keys = [f"{prefix}{i}.{name}" for i in range(self.num_heads)]
+            if all(key in state_dict for key in keys):
+                state_dict[f"{prefix}fc.{name}"] = torch.cat([state_dict.pop(key) for key in keys])
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
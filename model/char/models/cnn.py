@@ -1,8 +1,7 @@
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from model.char.config import config
-from model.char.models.base import BaseModel
+from model.char.models.base import BaseModel, MultiHead
 
 
 class CNN(BaseModel):
@@ -23,10 +22,7 @@ class CNN(BaseModel):
         self.dropout = nn.Dropout(0.5)
 
         # 多任务输出头
-        self.heads = nn.ModuleList([
-            nn.Linear(256, config.NUM_CLASSES)
-            for _ in range(config.CAPTCHA_LENGTH)
-        ])
+        self.heads = MultiHead(256)
 
     def forward(self, x):
         x = self.pool(F.relu(self.conv1(x)))
@@ -35,4 +31,4 @@ class CNN(BaseModel):
         x = torch.flatten(x, 1)
         x = F.relu(self.fc1(x))
         x = self.dropout(x)
-        return tuple(head(x) for head in self.heads)
\ No newline at end of file
+        return self.heads(x)
\ No newline at end of file
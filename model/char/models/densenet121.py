@@ -2,8 +2,7 @@ import torch
 from torch import nn
 from torchvision.models import densenet121
 
-from model.char.config import config
-from model.char.models.base import BaseModel
+from model.char.models.base import BaseModel, MultiHead
 
 
 class DenseNet121(BaseModel):
@@ -26,14 +25,11 @@ class DenseNet121(BaseModel):
         self.densenet.classifier = nn.Identity()
 
         # 多任务输出头
-        self.heads = nn.ModuleList([
-            nn.Linear(num_features, config.NUM_CLASSES)  # DenseNet121最终特征维度1024
-            for _ in range(config.CAPTCHA_LENGTH)
-        ])
+        self.heads = MultiHead(num_features)  # DenseNet121最终特征维度1024
 
     def forward(self, x):
         x = self.densenet.features(x)
         x = nn.functional.relu(x, inplace=True)
         x = nn.functional.adaptive_avg_pool2d(x, (1, 1))
         x = torch.flatten(x, 1)
-        return tuple(head(x) for head in self.heads) 
\ No newline at end of file
+        return self.heads(x)
\ No newline at end of file
@@ -2,8 +2,7 @@ import torch
 from torch import nn
 from torchvision.models import efficientnet_b0
 
-from model.char.config import config
-from model.char.models.base import BaseModel
+from model.char.models.base import BaseModel, MultiHead
 
 
 class EfficientNetB0(BaseModel):
@@ -26,13 +25,10 @@ class EfficientNetB0(BaseModel):
         self.efficientnet.classifier = nn.Identity()
 
         # 多任务输出头
-        self.heads = nn.ModuleList([
-            nn.Linear(num_features, config.NUM_CLASSES)  # EfficientNet-B0最终特征维度1280
-            for _ in range(config.CAPTCHA_LENGTH)
-        ])
+        self.heads = MultiHead(num_features)  # EfficientNet-B0最终特征维度1280
 
     def forward(self, x):
         x = self.efficientnet.features(x)
         x = self.efficientnet.avgpool(x)
         x = torch.flatten(x, 1)
-        return tuple(head(x) for head in self.heads) 
\ No newline at end of file
+        return self.heads(x)
\ No newline at end of file
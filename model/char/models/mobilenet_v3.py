@@ -2,8 +2,7 @@ import torch
 from torch import nn
 from torchvision.models import mobilenet_v3_small
 
-from model.char.config import config
-from model.char.models.base import BaseModel
+from model.char.models.base import BaseModel, MultiHead
 
 
 class MobileNetV3Small(BaseModel):
@@ -26,13 +25,10 @@ class MobileNetV3Small(BaseModel):
         self.mobilenet.classifier = nn.Identity()
 
         # 多任务输出头
-        self.heads = nn.ModuleList([
-            nn.Linear(num_features, config.NUM_CLASSES)  # MobileNetV3 Small最终特征维度576
-            for _ in range(config.CAPTCHA_LENGTH)
-        ])
+        self.heads = MultiHead(num_features)  # MobileNetV3 Small最终特征维度576
 
     def forward(self, x):
         x = self.mobilenet.features(x)
         x = self.mobilenet.avgpool(x)
         x = torch.flatten(x, 1)
-        return tuple(head(x) for head in self.heads) 
\ No newline at end of file
+        return self.heads(x)
\ No newline at end of file
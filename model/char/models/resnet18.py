@@ -2,8 +2,7 @@ import torch
 from torch import nn
 from torchvision.models import resnet18
 
-from model.char.config import config
-from model.char.models.base import BaseModel
+from model.char.models.base import BaseModel, MultiHead
 
 
 class ResNet18(BaseModel):
@@ -21,10 +20,7 @@ class ResNet18(BaseModel):
         self.resnet.fc = nn.Identity()
 
         # 多任务输出头
-        self.heads = nn.ModuleList([
-            nn.Linear(512, config.NUM_CLASSES)  # ResNet18最终特征维度512
-            for _ in range(config.CAPTCHA_LENGTH)
-        ])
+        self.heads = MultiHead(512)  # ResNet18最终特征维度512
 
     def forward(self, x):
         x = self.resnet.conv1(x)
@@ -39,4 +35,4 @@ class ResNet18(BaseModel):
 
         x = self.resnet.avgpool(x)
         x = torch.flatten(x, 1)
-        return tuple(head(x) for head in self.heads)
\ No newline at end of file
+        return self.heads(x)
\ No newline at end of file
@@ -2,8 +2,7 @@ import torch
 from torch import nn
 from torchvision.models import resnet50
 
-from model.char.config import config
-from model.char.models.base import BaseModel
+from model.char.models.base import BaseModel, MultiHead
 
 
 class ResNet50(BaseModel):
@@ -21,10 +20,7 @@ class ResNet50(BaseModel):
         self.resnet.fc = nn.Identity()
 
         # 多任务输出头
-        self.heads = nn.ModuleList([
-            nn.Linear(2048, config.NUM_CLASSES)  # ResNet50最终特征维度2048
-            for _ in range(config.CAPTCHA_LENGTH)
-        ])
+        self.heads = MultiHead(2048)  # ResNet50最终特征维度2048
 
     def forward(self, x):
         x = self.resnet.conv1(x)
@@ -39,4 +35,4 @@ class ResNet50(BaseModel):
 
         x = self.resnet.avgpool(x)
         x = torch.flatten(x, 1)
-        return tuple(head(x) for head in self.heads) 
\ No newline at end of file
+        return self.heads(x)
\ No newline at end of file
@@ -17,7 +17,7 @@ if __name__ == '__main__':
     print(f"   - 字符集大小: {config.NUM_CLASSES}")
     print(f"   - 图像大小: {config.IMAGE_SIZE}")
 
-    # 生成数据集
+    # 生成数据集（同时写入预解码缓存）
     generator.generate(config.TOTAL_SAMPLES)
 
     # 打印结果
@@ -2,13 +2,14 @@ import numpy as np
 import torch
 import torch.nn.functional as F
 from sklearn.metrics import (
-    confusion_matrix, precision_score, recall_score, 
-    f1_score, precision_recall_curve, average_precision_score,
-    roc_auc_score, accuracy_score
+    confusion_matrix, precision_score, recall_score,
+    f1_score, roc_auc_score
 )
+import matplotlib
+# 非交互式后端：图表只渲染为图片，且可在后台绘图线程中使用
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-import seaborn as sns
-from typing import List, Dict, Tuple, Union, Optional
+from typing import List, Dict, Tuple, Union, Optional, Sequence
 import io
 from PIL import Image
 from torchvision import transforms
@@ -17,45 +18,48 @@ from torchvision import transforms
 plt.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei']  # 优先微软雅黑，备选黑体
 plt.rcParams['axes.unicode_minus'] = False  # 解决负号显示异常
 
-def calculate_accuracy(outputs: List[torch.Tensor], labels: torch.Tensor) -> float:
+def get_predictions(outputs: Union[torch.Tensor, Sequence[torch.Tensor]]) -> torch.Tensor:
+    """
+    计算各位置的预测类别 [B, L]
+    
+    outputs 可以是堆叠后的 [B, L, C] 张量（单次 argmax）、各位置 [B, C] 输出的序列，
+    或已经算好的整数预测 [B, L]（原样返回）
+    """
+    if isinstance(outputs, torch.Tensor):
+        if not outputs.is_floating_point():
+            return outputs
+        return outputs.argmax(-1)
+    return torch.stack([output.argmax(1) for output in outputs], dim=1)
+
+
+def calculate_accuracy(outputs: Union[torch.Tensor, Sequence[torch.Tensor]], labels: torch.Tensor) -> float:
     """
     计算整体准确率（所有字符都预测正确的比例）
     """
-    predictions = torch.stack([output.argmax(1) for output in outputs], dim=1)
+    predictions = get_predictions(outputs)
     correct = (predictions == labels).all(dim=1).sum().item()
     return correct / labels.size(0)
 
 
-def calculate_position_accuracy(outputs: List[torch.Tensor], labels: torch.Tensor) -> List[float]:
+def calculate_position_accuracy(outputs: Union[torch.Tensor, Sequence[torch.Tensor]], labels: torch.Tensor) -> List[float]:
     """
     计算每个位置的准确率
     """
-    position_acc = []
-    for i, output in enumerate(outputs):
-        predictions = output.argmax(1)
-        correct = (predictions == labels[:, i]).sum().item()
-        position_acc.append(correct / labels.size(0))
-    return position_acc
+    predictions = get_predictions(outputs)
+    return (predictions == labels).double().mean(dim=0).tolist()
 
 
-def calculate_char_accuracy(outputs: List[torch.Tensor], labels: torch.Tensor, num_classes: int) -> Dict[int, float]:
+def calculate_char_accuracy(outputs: Union[torch.Tensor, Sequence[torch.Tensor]], labels: torch.Tensor, num_classes: int) -> Dict[int, float]:
     """
     计算每个字符的准确率
     """
-    char_correct = {i: 0 for i in range(num_classes)}
-    char_total = {i: 0 for i in range(num_classes)}
-    
-    for i, output in enumerate(outputs):
-        predictions = output.argmax(1)
-        for j in range(len(predictions)):
-            label = labels[j, i].item()
-            char_total[label] += 1
-            if predictions[j].item() == label:
-                char_correct[label] += 1
-    
-    char_accuracy = {char: (correct / char_total[char] if char_total[char] > 0 else 0) 
-                    for char, correct in char_correct.items()}
-    return char_accuracy
+    predictions = get_predictions(outputs)
+    targets = labels.flatten()
+    # 按类别统计出现次数与预测正确次数
+    char_total = torch.bincount(targets, minlength=num_classes)
+    char_correct = torch.bincount(targets[(predictions == labels).flatten()], minlength=num_classes)
+    char_accuracy = char_correct / char_total.clamp(min=1)
+    return dict(enumerate(char_accuracy.tolist()))
 
 
 def calculate_confusion_matrices(outputs: List[torch.Tensor], labels: torch.Tensor, num_classes: int) -> List[np.ndarray]:
@@ -153,19 +157,21 @@ def plot_confusion_matrix(cm: np.ndarray, classes: Optional[List[str]] = None, n
         cm = np.nan_to_num(cm)  # 替换NaN为0
     
     fig, ax = plt.subplots(figsize=(10, 10))
-    sns.heatmap(cm, annot=False, fmt='.2f' if normalize else 'd', 
-                cmap='Blues', square=True, ax=ax)
+    image = ax.imshow(cm, cmap='Blues', interpolation='nearest')
+    fig.colorbar(image, ax=ax, fraction=0.046, pad=0.04)
     
     # 设置标签
     if classes:
         tick_marks = np.arange(len(classes))
         # 将横坐标标签竖向显示
-        plt.xticks(tick_marks + 0.5, classes, rotation=90, verticalalignment='top')
-        plt.yticks(tick_marks + 0.5, classes, rotation=0)
+        ax.set_xticks(tick_marks)
+        ax.set_xticklabels(classes, rotation=90, verticalalignment='top')
+        ax.set_yticks(tick_marks)
+        ax.set_yticklabels(classes)
     
-    plt.ylabel('真实标签')
-    plt.xlabel('预测标签')
-    plt.tight_layout()
+    ax.set_ylabel('真实标签')
+    ax.set_xlabel('预测标签')
+    fig.tight_layout()
     
     return fig
 
@@ -185,6 +191,11 @@ def plot_sample_predictions(images: torch.Tensor, predictions: torch.Tensor,
     fig, axes = plt.subplots(grid_size, grid_size, figsize=(15, 15))
     axes = axes.flatten()
     
+    # 一次性转换为 Python 列表，避免逐元素索引张量
+    chars = tuple(char_set)
+    predictions = predictions.tolist()
+    targets = targets.tolist()
+    
     for i, idx in enumerate(indices):
         if i >= len(axes):
             break
@@ -194,8 +205,8 @@ def plot_sample_predictions(images: torch.Tensor, predictions: torch.Tensor,
         axes[i].imshow(img, cmap='gray')
         
         # 获取预测和真实标签
-        pred_chars = ''.join([char_set[p] for p in predictions[idx]])
-        true_chars = ''.join([char_set[t] for t in targets[idx]])
+        pred_chars = ''.join([chars[p] for p in predictions[idx]])
+        true_chars = ''.join([chars[t] for t in targets[idx]])
         
         # 设置标题和隐藏坐标轴
         color = 'green' if pred_chars == true_chars else 'red'
@@ -4,9 +4,11 @@ import os
 import platform
 import shutil
 from datetime import datetime
+from typing import Optional
 
 import psutil
 import torch
+from torch import nn
 
 from model.char.config import config
 from model.char.models.base import BaseModel
@@ -21,6 +23,37 @@ def load_model(model_path: str):
     model.load_state_dict(state['model_state_dict'])
     return model
 
+def compile_model(model: nn.Module, device: torch.device, example_input: torch.Tensor,
+                  mode: Optional[str] = None, dynamic: Optional[bool] = False) -> nn.Module:
+    """用 torch.compile 编译模型（仅 CUDA），编译或试运行失败时回退为原模型
+
+    torch.compile 是惰性的，Inductor/Triton 的错误在第一次前向时才出现，
+    因此这里用示例输入做一次前向试运行（评估模式、不记录梯度，不改变 BN 统计量），
+    失败则继续使用未编译的模型。编译后的模型与原模型共享参数，仅用于前向计算
+
+    Args:
+        model: 模型
+        device: 模型所在设备
+        example_input: 试运行的示例输入
+        mode: torch.compile 编译模式，None 表示不编译
+        dynamic: 是否按动态形状编译，None 表示输入形状变化后自动切换为动态形状
+    """
+    if mode is None or device.type != 'cuda' or not hasattr(torch, 'compile'):
+        return model
+    training = model.training
+    try:
+        compiled_model = torch.compile(model, mode=mode, dynamic=dynamic)
+        model.eval()
+        with torch.no_grad():
+            compiled_model(example_input)
+        return compiled_model
+    except Exception as e:
+        print(f"模型编译失败，使用未编译模型: {e}")
+        torch._dynamo.reset()
+        return model
+    finally:
+        model.train(training)
+
 def save_checkpoint(trainer):
     """保存检查点
 
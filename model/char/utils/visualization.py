@@ -1,7 +1,6 @@
-import os
-from typing import Dict, List, Optional, Tuple, Union
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Union
 
-import numpy as np
 import torch
 from torch.utils.tensorboard import SummaryWriter
 
@@ -25,6 +24,39 @@ class TensorboardLogger:
         """
         self.writer = SummaryWriter(log_dir=log_dir)
         self.log_dir = log_dir
+        # 图表在后台线程中绘制并写入，不阻塞训练；单个线程保证 pyplot 调用串行执行
+        self._plot_executor = ThreadPoolExecutor(max_workers=1)
+        self._pending: List[Future] = []
+    
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """
+        在后台绘图线程中执行 fn，所有 pyplot 绘图都应经由此方法提交
+        
+        Args:
+            fn: 绘图函数
+            *args, **kwargs: 传给 fn 的参数（应为 CPU 上、之后不再修改的数据）
+        
+        Returns:
+            对应的 Future
+        """
+        future = self._plot_executor.submit(fn, *args, **kwargs)
+        # 任务结束时立即报告异常，不必等到 flush
+        future.add_done_callback(self._report_failure)
+        self._pending = [f for f in self._pending if not f.done()] + [future]
+        return future
+    
+    @staticmethod
+    def _report_failure(future: Future):
+        """打印后台绘图任务的异常（不抛出，绘图失败不中断训练）"""
+        if not future.cancelled() and future.exception() is not None:
+            error = future.exception()
+            print(f"⚠️ 后台绘图失败: {type(error).__name__}: {error}")
+    
+    def flush(self):
+        """等待已提交的绘图任务完成（异常已由 _report_failure 打印），然后刷新写入器"""
+        pending, self._pending = self._pending, []
+        wait(pending)
+        self.writer.flush()
     
     def log_scalars(self, tag: str, scalar_dict: Dict[str, float], global_step: int):
         """
@@ -115,6 +147,11 @@ class TensorboardLogger:
             char_set: 字符集
             epoch: 当前轮次
         """
+        self.submit(self._log_confusion_matrices, outputs, labels, num_classes, char_set, epoch)
+    
+    def _log_confusion_matrices(self, outputs: List[torch.Tensor], labels: torch.Tensor,
+                                num_classes: int, char_set: str, epoch: int):
+        """在绘图线程中计算并绘制混淆矩阵"""
         confusion_matrices = calculate_confusion_matrices(outputs, labels, num_classes)
         char_classes = list(char_set)
         
@@ -183,10 +220,13 @@ class TensorboardLogger:
         # 将输出转换为预测的类别索引
         predictions = torch.stack([output.argmax(1) for output in outputs], dim=1)
         
-        # 绘制预测结果图
+        # 绘制预测结果图并记录（图像先拷贝回主机，避免绘图线程访问设备张量）
+        self.submit(self._log_sample_predictions, images.cpu(), predictions.cpu(), labels, char_set, epoch, num_samples)
+    
+    def _log_sample_predictions(self, images: torch.Tensor, predictions: torch.Tensor,
+                                labels: torch.Tensor, char_set: str, epoch: int, num_samples: int):
+        """在绘图线程中绘制并记录样本预测结果"""
         fig = plot_sample_predictions(images, predictions, labels, char_set, num_samples)
-        
-        # 记录图表
         self.log_figure(f'predictions/samples', fig, epoch)
     
     def log_comprehensive_metrics(self, outputs: List[torch.Tensor], labels: torch.Tensor, 
@@ -230,10 +270,12 @@ class TensorboardLogger:
         if phase in ['valid', 'test']:
             self.log_confusion_matrices(outputs, labels, config.NUM_CLASSES, config.CHAR_SET, epoch)
         
-        # 如果提供了图像，并且每5个epoch记录一次预测结果
-        if images is not None and epoch % 5 == 0:
+        # 如果提供了图像，按记录间隔记录预测结果
+        if images is not None and epoch % config.LOG_INTERVAL == 0:
             self.log_sample_predictions(images, outputs, labels, config.CHAR_SET, epoch)
     
     def close(self):
-        """关闭SummaryWriter"""
+        """等待后台绘图完成并关闭SummaryWriter"""
+        self.flush()
+        self._plot_executor.shutdown()
         self.writer.close() 
\ No newline at end of file